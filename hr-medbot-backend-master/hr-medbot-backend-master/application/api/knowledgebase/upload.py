@@ -19,6 +19,8 @@ from insertion.neo_inserter import NeoInserter
 
 CONCURRENCY_LIMIT: int = int(os.getenv("KB_CONCURRENCY_LIMIT", "3"))
 QUEUE_LIMIT: int = int(os.getenv("KB_QUEUE_LIMIT", "10"))
+# Seconds clients are told to wait (Retry-After) when the queue is full
+BUSY_RETRY_AFTER_S: int = int(os.getenv("KB_BUSY_RETRY_AFTER_S", "5"))
 CACHE_DIR = os.getenv("KB_CACHE_DIR", "/tmp/neo_kb_queue")
 UPLOAD_TMP_DIR = Path(os.getenv("KB_UPLOAD_TMP_DIR", "/tmp/neo_kb_uploads"))
 UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
@@ -48,7 +50,11 @@ def _set_in_progress(s: set[str]) -> None:
 @_with_lock
 def _enqueue_job(file_path: Path, title: str, file_kwargs: dict[str, list[str]] | None = None) -> str:
     if len(queue) >= QUEUE_LIMIT:
-        raise HTTPException(status_code=503, detail="Server busy, please try again later.")
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please try again later.",
+            headers={"Retry-After": str(BUSY_RETRY_AFTER_S)},
+        )
     job_id = str(uuid.uuid4())
     cache.set(
         f"job:{job_id}",
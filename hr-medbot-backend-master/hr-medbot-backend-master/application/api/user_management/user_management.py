@@ -8,7 +8,8 @@ from api.authentication import (
     get_authenticated_user
 )
 import re, bcrypt
-from pydantic import BaseModel, validator, ConfigDict, constr
+from pydantic import BaseModel, validator, ConfigDict, constr, Field
+from sqlalchemy.exc import IntegrityError
 
 
 
@@ -98,6 +99,20 @@ class CreateUserRequest(BaseModel):
         return v
 
 
+# Each user costs one bcrypt hash (~0.3 s); keep a batch to a few seconds
+BULK_CREATE_MAX_USERS = 20
+
+
+class BulkCreateUsersRequest(BaseModel):
+    users: List[CreateUserRequest] = Field(..., min_length=1, max_length=BULK_CREATE_MAX_USERS)
+
+
+class BulkCreateUserResult(BaseModel):
+    username: str
+    status_code: int
+    detail: Optional[str] = None
+
+
 class UpdateUserRequest(BaseModel):
     username: Optional[str] = None
     first_name: Optional[str] = None
@@ -137,6 +152,29 @@ def _ensure_admin(user: User):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
 
 
+def _creation_conflict(db, req: CreateUserRequest) -> Optional[str]:
+    """Return the uniqueness error for creating *req*, or ``None`` if it is free."""
+    if db.query(User).filter(User.username == req.username).first():
+        return "Username already exists"
+    if req.email and db.query(User).filter(User.email == req.email).first():
+        return "Email already used"
+    if req.phone_number and db.query(User).filter(User.phone_number == req.phone_number).first():
+        return "Phone number already used"
+    return None
+
+
+def _new_user(req: CreateUserRequest, hashed_password: str) -> User:
+    return User(
+        username=req.username,
+        hashed_password=hashed_password,
+        first_name=req.first_name,
+        last_name=req.last_name,
+        phone_number=req.phone_number,
+        email=req.email,
+        is_admin=req.is_admin
+    )
+
+
 def _get_user_or_404(db, user_id: uuid.UUID) -> User:
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
@@ -158,28 +196,53 @@ async def create_user(
 
     with session_scope(write_enabled=True) as db:
         # Unique constraints --------------------------------------------------
-        if db.query(User).filter(User.username == req.username).first():
-            raise HTTPException(status_code=400, detail="Username already exists")
-        if req.email and db.query(User).filter(User.email == req.email).first():
-            raise HTTPException(status_code=400, detail="Email already used")
-        if req.phone_number and db.query(User).filter(User.phone_number == req.phone_number).first():
-            raise HTTPException(status_code=400, detail="Phone number already used")
-
-        new_user = User(
-            username=req.username,
-            hashed_password=get_password_hash(req.password),
-            first_name=req.first_name,
-            last_name=req.last_name,
-            phone_number=req.phone_number,
-            email=req.email,
-            is_admin=req.is_admin
-        )
+        conflict = _creation_conflict(db, req)
+        if conflict:
+            raise HTTPException(status_code=400, detail=conflict)
+
+        new_user = _new_user(req, get_password_hash(req.password))
         db.add(new_user)
         db.flush()
         db.refresh(new_user)
         return new_user
 
 
+@UserManagementRouter.post("/bulk", response_model=List[BulkCreateUserResult])
+def create_users_bulk(
+    req: BulkCreateUsersRequest,
+    current_user: Annotated[User, Depends(get_authenticated_user)],
+):
+    """Create several users in one request (admin only).
+
+    Every user gets its own result with the status code the single-user
+    endpoint would have returned; each insert runs in a savepoint so a
+    conflict does not abort the rest of the batch. Declared without ``async``
+    so FastAPI runs it in its threadpool: the bcrypt hashes would otherwise
+    block the event loop for the whole batch.
+    """
+    _ensure_admin(current_user)
+
+    # Hash up front so the DB connection is not held through the bcrypt work
+    hashed_passwords = [get_password_hash(item.password) for item in req.users]
+    results: List[BulkCreateUserResult] = []
+    with session_scope(write_enabled=True) as db:
+        for item, hashed_password in zip(req.users, hashed_passwords):
+            conflict = _creation_conflict(db, item)
+            if conflict:
+                results.append(BulkCreateUserResult(username=item.username, status_code=400, detail=conflict))
+                continue
+            try:
+                with db.begin_nested():
+                    db.add(_new_user(item, hashed_password))
+            except IntegrityError:
+                # Lost a race with a concurrent insert of the same user
+                detail = _creation_conflict(db, item) or "Username already exists"
+                results.append(BulkCreateUserResult(username=item.username, status_code=400, detail=detail))
+                continue
+            results.append(BulkCreateUserResult(username=item.username, status_code=status.HTTP_201_CREATED))
+    return results
+
+
 @UserManagementRouter.put("/{user_id}", response_model=UserResponse)
 async def update_user(
     user_id: str,
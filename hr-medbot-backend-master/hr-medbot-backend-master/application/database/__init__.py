@@ -5,17 +5,40 @@ from contextlib import contextmanager
 from . import models
 
 DATABASE_URL = os.getenv("DATABASE_URI")
+# HNSW search breadth for ANN queries: higher means better recall, lower QPS.
+# Sensible range is 40 (pgvector default) to 200.
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", max(8, os.cpu_count() or 1)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "16"))
+
+_engine_options = {}
+if sqlalchemy.engine.make_url(DATABASE_URL).get_driver_name() == "psycopg2":
+    _engine_options["executemany_mode"] = 'values_plus_batch' # optimize batch operations
 
 engine = sqlalchemy.create_engine(
     DATABASE_URL,
-    pool_size=5, # default pool size
-    max_overflow=10, # allow 10 connections beyond pool_size
+    pool_size=DB_POOL_SIZE, # sized for concurrent ingestion jobs + API traffic
+    max_overflow=DB_MAX_OVERFLOW, # extra connections beyond pool_size
     pool_timeout=30, # timeout after 30s waiting for a connection
     pool_recycle=1800, # recycle connections after 30 min
     pool_pre_ping=True, # verify connections before using from pool
-    executemany_mode='values_plus_batch' # optimize batch operations
+    pool_use_lifo=True, # reuse the warmest connection, let idle ones expire
+    **_engine_options
 )
 
+if engine.dialect.driver == "psycopg":
+    from pgvector.psycopg import register_vector
+
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def _register_vector(dbapi_connection, connection_record):
+        # Binary dumpers for numpy arrays: float32 embeddings go over the wire as raw bytes.
+        # Queries bind ndarrays directly under psycopg, so a connection without the
+        # dumpers is unusable: a missing vector extension fails the connect here
+        # (and the pool retries on the next checkout) instead of every query later.
+        register_vector(dbapi_connection)
+        dbapi_connection.rollback()
+
 # Create a session factory with thread safety
 session_factory = sessionmaker(bind=engine,
                                autoflush=False,
@@ -38,4 +61,19 @@ def session_scope(write_enabled=False):
     finally:
         session.close()
 
-__all__ = ["session_scope", "models"]
+
+@contextmanager
+def ann_session(session, ef_search: int | None = None):
+    """Raise ``hnsw.ef_search`` for the current transaction of *session*.
+
+    Wrap every ANN query on an embedding column; the setting is transaction
+    local, so it never leaks into pooled connections.
+    """
+    session.execute(
+        sqlalchemy.text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+        {"ef": str(ef_search or HNSW_EF_SEARCH)},
+    )
+    yield session
+
+
+__all__ = ["session_scope", "ann_session", "HNSW_EF_SEARCH", "models"]
@@ -100,19 +100,29 @@ class GoldenChunker:
     # ------------------------------------------------------------------
     def _split_by_section(self, text: str) -> Iterable[str]:
         """Yield raw sections separated by SECTION_PATTERN delimiter lines."""
-        for part in re.split(self.SECTION_PATTERN, text):
+        # Every delimiter contains "---"; a substring probe is far cheaper than
+        # running the multiline regex over documents that have none.
+        if "---" not in text:
+            if text:
+                yield text
+            return
+        for part in self.SECTION_PATTERN.split(text):
             if part:  # ignore empty strings that result from split
                 yield part
 
     def _split_recursively(self, text: str) -> List[str]:
         """Recursively split *text* on headings until chunks fit ``max_size``."""
+        cs = self.chunk_size
+        if len(text) <= cs:
+            return [text]
+
         oversized: List[str] = [text]
         chunks: List[str] = []
 
         for level in range(1, 7):
             next_round: List[str] = []
             for piece in oversized:
-                if len(piece) <= self.chunk_size:
+                if len(piece) <= cs:
                     chunks.append(piece)
                     continue
 
@@ -123,8 +133,10 @@ class GoldenChunker:
                     continue
 
                 for sub in sub_parts:
-                    target = chunks if len(sub) <= self.chunk_size else next_round
-                    target.append(sub)
+                    if len(sub) <= cs:
+                        chunks.append(sub)
+                    else:
+                        next_round.append(sub)
 
             oversized = next_round
             if not oversized:  # Everything fits – we can stop early.
@@ -147,26 +159,54 @@ class GoldenChunker:
         If no headings of *level* are found the original text is returned as a
         single-element list so that callers can easily detect the situation.
         """
-        # RegEx for an *exact* level heading, e.g. level-2 => "## "
-        pattern = re.compile(rf"^({'#' * level})\s+.*$", flags=re.MULTILINE)
-        matches = list(pattern.finditer(text))
-        if not matches:
+        starts = self._find_heading_starts(text, level)
+        if not starts:
             return [text]
 
         # Build slices that start at each heading and end right *before* the
         # next heading (or EOF).
-        chunks: List[str] = []
-        for idx, match in enumerate(matches):
-            start = match.start()
-            end = matches[idx + 1].start() if idx + 1 < len(matches) else len(text)
-            chunks.append(text[start:end])
+        ends = starts[1:] + [len(text)]
+        chunks: List[str] = [text[start:end] for start, end in zip(starts, ends)]
 
         # Pre-heading content (if any) should precede the first chunk.
-        preamble = text[: matches[0].start()].strip("\n")
+        preamble = text[: starts[0]].strip("\n")
         if preamble:
             chunks.insert(0, preamble)
         return chunks
 
+    @staticmethod
+    def _find_heading_starts(text: str, level: int) -> List[int]:
+        r"""Return the offsets of level-*level* ATX heading lines in *text*.
+
+        Equivalent to ``re.finditer(r"^#{level}\s+.*$", text, re.MULTILINE)``
+        but driven by ``str.find`` so only lines starting with the heading
+        marker are ever inspected.
+        """
+        prefix = "#" * level
+        n = len(prefix)
+        needle = "\n" + prefix
+        candidates: List[int] = [0] if text.startswith(prefix) else []
+        idx = text.find(needle)
+        while idx != -1:
+            candidates.append(idx + 1)
+            idx = text.find(needle, idx + n + 1)
+
+        starts: List[int] = []
+        for start in candidates:
+            # Exact level only: the marker must be followed by whitespace.
+            if not text[start + n : start + n + 1].isspace():
+                continue
+            eol = text.find("\n", start)
+            if eol == -1:
+                eol = len(text)
+            if not text[start + n : eol].strip():
+                # Marker-only line: the regex' ``\s+`` swallows the following
+                # line(s) too, so defer to it for identical boundaries.
+                pattern = re.compile(rf"^({prefix})\s+.*$", flags=re.MULTILINE)
+                return [m.start() for m in pattern.finditer(text)]
+            starts.append(start)
+        return starts
+
     # ------------------------------------------------------------------
     # Post-processing helpers
     # ------------------------------------------------------------------
@@ -184,14 +224,17 @@ class GoldenChunker:
             return chunks
 
         merged: List[str] = chunks.copy()
+        min_size = self.min_size
+        max_size = self.max_size
 
         if self.merge_reversed:  # Bottom-up
             i = len(merged) - 1
             while i > 0:
-                if len(merged[i]) < self.min_size:
-                    candidate = merged[i - 1] + merged[i]
-                    if len(candidate) <= self.max_size:
-                        merged[i - 1] = candidate
+                size = len(merged[i])
+                if size < min_size:
+                    # Sizes are additive, so check the bound before concatenating.
+                    if len(merged[i - 1]) + size <= max_size:
+                        merged[i - 1] += merged[i]
                         del merged[i]
                         i = min(i, len(merged) - 1)
                         continue
@@ -199,10 +242,10 @@ class GoldenChunker:
         else:  # Top-down
             i = 0
             while i < len(merged) - 1:
-                if len(merged[i]) < self.min_size:
-                    candidate = merged[i] + merged[i + 1]
-                    if len(candidate) <= self.max_size:
-                        merged[i] = candidate
+                size = len(merged[i])
+                if size < min_size:
+                    if size + len(merged[i + 1]) <= max_size:
+                        merged[i] += merged[i + 1]
                         del merged[i + 1]
                         # Do not increment i – re-evaluate merged chunk
                         continue
@@ -1,3 +1,8 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
 from llm_client import Generator, Embedder
 from .chunkers import GoldenChunker
 from typing import List, Any
@@ -9,6 +14,23 @@ DEFAULT_SUMMARIZATION_SYSPROMPT =  (
 "no other commentary."
 )
 
+DEFAULT_BATCH_SUMMARIZATION_SYSPROMPT = (
+"You are a helpful assistant. You will receive {n} text blocks, each wrapped in "
+"<block id=\"...\"></block> tags. Summarize every block in the same language as the "
+"block, in at most 3 concise sentences. Respond with a JSON array of exactly {n} strings, "
+"where the i-th string is the summary of block i—no intro, no headings, no other commentary."
+)
+
+# Process-wide summary cache shared by every NeoInserter (upload jobs each build
+# their own inserter). Keyed on a digest so the cache never holds chunk texts.
+SUMMARY_CACHE_SIZE = 4096
+
+# Reply budget per block of a batched summary call: three sentences plus the
+# JSON quoting around them.
+SUMMARY_MAX_TOKENS_PER_BLOCK = 250
+_summary_cache: "OrderedDict[tuple[str | None, str], str]" = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
 
 class NeoInserter:
 
@@ -24,9 +46,15 @@ class NeoInserter:
         sc_min_size = 256,
         #-----
         batch_size = 128,
+        summary_batch_size = 8,
+        summary_batch_chars = 20000,
         enable_summaries: bool = True
     ):
         self.enable_summaries = enable_summaries
+        self.summary_batch_size = max(1, summary_batch_size)
+        # Caps the prompt of a batched summary call; big chunks run up to
+        # bc_max_size characters, so a batch usually holds only a few.
+        self.summary_batch_chars = max(1, summary_batch_chars)
         self.generator = Generator()
         self.embedder = Embedder()
         self.big_chunker = GoldenChunker(
@@ -42,8 +70,40 @@ class NeoInserter:
         self.batch_size = max(1, batch_size)
 
     
+    def _summary_key(self, text: str) -> tuple[str | None, str]:
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        return self.generator.model, digest
+
+    @staticmethod
+    def _get_cached_summary(key: tuple[str | None, str]) -> str | None:
+        with _summary_cache_lock:
+            summary = _summary_cache.get(key)
+            if summary is not None:
+                _summary_cache.move_to_end(key)
+            return summary
+
+    @staticmethod
+    def _set_cached_summary(key: tuple[str | None, str], summary: str) -> None:
+        with _summary_cache_lock:
+            _summary_cache[key] = summary
+            _summary_cache.move_to_end(key)
+            if len(_summary_cache) > SUMMARY_CACHE_SIZE:
+                _summary_cache.popitem(last=False)
+
     def _generate_summary(self, text: str) -> str:
-        """Generate a concise summary for *text* using the configured LLM."""
+        """Generate a concise summary for *text* using the configured LLM.
+
+        Results are memoized so repeated boilerplate chunks cost one LLM call.
+        """
+        key = self._summary_key(text)
+        cached = self._get_cached_summary(key)
+        if cached is not None:
+            return cached
+        summary = self._generate_summary_uncached(text)
+        self._set_cached_summary(key, summary)
+        return summary
+
+    def _generate_summary_uncached(self, text: str) -> str:
         response = self.generator(
             messages=[
                 {
@@ -55,17 +115,105 @@ class NeoInserter:
             stream=False,
         )
         return response
-    
-    def _embed_in_batches(self, payload: List[str]) -> List[List[float]]:
+
+    def _generate_summary_batch(self, texts: List[str]) -> List[str]:
+        """Summarize all *texts* with a single LLM call.
+
+        Raises ``ValueError`` if the reply is not a JSON array of ``len(texts)``
+        strings.
+        """
+        blocks = "\n\n".join(
+            f'<block id="{i}">\n{text}\n</block>' for i, text in enumerate(texts, start=1)
+        )
+        response = self.generator(
+            messages=[
+                {
+                    "role": "system",
+                    "content": DEFAULT_BATCH_SUMMARIZATION_SYSPROMPT.format(n=len(texts)),
+                },
+                {"role": "user", "content": blocks},
+            ],
+            stream=False,
+            max_tokens=SUMMARY_MAX_TOKENS_PER_BLOCK * len(texts),
+        )
+        # Tolerate code fences or stray prose around the array.
+        start, end = response.find("["), response.rfind("]")
+        if start == -1 or end < start:
+            raise ValueError("Batch summary response contains no JSON array")
+        parsed = json.loads(response[start : end + 1])
+        if (
+            not isinstance(parsed, list)
+            or len(parsed) != len(texts)
+            or not all(isinstance(item, str) and item.strip() for item in parsed)
+        ):
+            raise ValueError("Batch summary response does not match the number of blocks")
+        return [item.strip() for item in parsed]
+
+    def _summary_batches(self, items: List[tuple]) -> List[List[tuple]]:
+        """Split ``(key, text)`` *items* into batches of at most ``summary_batch_size``
+        items and ``summary_batch_chars`` characters (a longer text gets a batch of its own).
+        """
+        batches: List[List[tuple]] = []
+        batch: List[tuple] = []
+        chars = 0
+        for item in items:
+            if batch and (len(batch) >= self.summary_batch_size or chars + len(item[1]) > self.summary_batch_chars):
+                batches.append(batch)
+                batch, chars = [], 0
+            batch.append(item)
+            chars += len(item[1])
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _generate_summaries(self, texts: List[str]) -> List[str]:
+        """Summarize *texts*, batching blocks into one LLM call up to
+        ``summary_batch_size`` blocks and ``summary_batch_chars`` characters.
+
+        Cached and duplicate texts are summarized only once. Batches whose
+        reply cannot be parsed are retried one text at a time; a text that
+        still cannot be summarized falls back to its first 200 characters.
+        """
+        keys = [self._summary_key(text) for text in texts]
+        resolved: dict[tuple[str | None, str], str] = {}
+        pending: dict[tuple[str | None, str], str] = {}
+        for key, text in zip(keys, texts):
+            if key in resolved or key in pending:
+                continue
+            cached = self._get_cached_summary(key)
+            if cached is not None:
+                resolved[key] = cached
+            else:
+                pending[key] = text
+
+        for batch in self._summary_batches(list(pending.items())):
+            if len(batch) > 1:
+                try:
+                    batch_summaries = self._generate_summary_batch([text for _, text in batch])
+                except Exception:
+                    pass
+                else:
+                    for (key, _), summary in zip(batch, batch_summaries):
+                        self._set_cached_summary(key, summary)
+                        resolved[key] = summary
+                    continue
+            for key, text in batch:
+                try:
+                    resolved[key] = self._generate_summary(text)
+                except Exception:
+                    resolved[key] = text[:200]
+        return [resolved[key] for key in keys]
+
+    def _embed_in_batches(self, payload: List[str]) -> np.ndarray:
         """Embed *payload* in deterministic order while respecting *batch_size*.
+
+        Returns a ``(len(payload), DB_VECTOR_DIMENSION)`` float32 array whose
+        rows can be handed to pgvector columns as-is.
         """
-        if not payload:
-            return []
-        result: List[List[float]] = []
+        result = np.empty((len(payload), models.DB_VECTOR_DIMENSION), dtype=np.float32)
         for start in range(0, len(payload), self.batch_size):
             batch = payload[start : start + self.batch_size]
-            embeds = self.embedder(batch)
-            result.extend(embeds)
+            result[start : start + len(batch)] = self.embedder.embed_batch_ndarray(batch)
         return result
 
     def insert(self, title:str, text:str, **file_kwargs):
@@ -102,13 +250,14 @@ class NeoInserter:
             embed_payload: List[str] = []
             work_items: List[dict[str, Any]] = []  # metadata for reconstructing
 
+            summaries: List[str] = (
+                self._generate_summaries(big_chunk_texts) if self.enable_summaries else []
+            )
+
             for big_idx, big_text in enumerate(big_chunk_texts):
                 # 2.a) Optional summary generation
                 if self.enable_summaries:
-                    try:
-                        summary_text = self._generate_summary(big_text)
-                    except Exception as exc:
-                        summary_text = big_text[:200]
+                    summary_text = summaries[big_idx]
 
                     work_items.append(
                         {
@@ -137,7 +286,7 @@ class NeoInserter:
             
 
             # 3) ----------------------------------------------------------------
-            embeddings: List[List[float]] = self._embed_in_batches(embed_payload)
+            embeddings: np.ndarray = self._embed_in_batches(embed_payload)
             # Map embeddings back to work_items in-place
             for item, vector in zip(work_items, embeddings, strict=True):
                 item["embedding"] = vector
@@ -202,24 +351,47 @@ class NeoInserter:
             # Failure handling – mark file as failed so retrieval skips it
             # ----------------------------------------------------------------
             with session_scope(write_enabled=True) as session:
-                file_row: models.File | None = session.query(models.File).get(inserted_file_id)
+                file_row: models.File | None = session.get(models.File, inserted_file_id)
                 if file_row is not None:
                     file_row.status = models.File.FileStatus.FAILED
                     file_row.error_message = str(exc)
-                    session.add(file_row)
                     session.flush()
             # Re-raise after marking failure so callers can see the error
             raise
 
 
 
+# ----------------------------------------------------------------------------
+# Bulk ingestion workers (one NeoInserter per process)
+# ----------------------------------------------------------------------------
+_worker_inserter: NeoInserter | None = None
+
+
+def _init_worker() -> None:
+    global _worker_inserter
+    _worker_inserter = NeoInserter()
+
+
+def _insert_path(fp: str, file_kwargs: dict[str, Any] | None = None) -> tuple[str, str | None]:
+    """Insert the markdown file at *fp*; return ``(fp, error or None)``."""
+    try:
+        with open(fp, "r", encoding="utf-8") as f:
+            content = f.read()
+        _worker_inserter.insert(fp, content, **(file_kwargs or {}))
+        return fp, None
+    except Exception as e:
+        return fp, str(e)
+
+
 if __name__ == "__main__":
+    import functools
+    import multiprocessing
     import os
     from tqdm import tqdm
 
-    inserter = NeoInserter()
     file_kwargs = {}
     src = "/data_playground/cleaned-Hors-Cadres"
+    workers = int(os.getenv("INSERT_WORKERS", os.cpu_count() or 1))
 
     md_files = [
         os.path.join(root, fname)
@@ -229,12 +401,21 @@ if __name__ == "__main__":
 
     print(f"Found {len(md_files)} markdown files.")
 
-    for fp in tqdm(md_files):
-        try:
-            with open(fp, "r", encoding="utf-8") as f:
-                content = f.read()
-            inserter.insert(fp, content, **file_kwargs)
-        except Exception as e:
-            print(f"Failed to insert file {fp}: {e}")
-            exit()
-            continue
+    # Files are independent, so they are ingested in parallel; "spawn" keeps
+    # DB engines and HTTP clients from being shared across forks.
+    # A failure does not stop the pool: terminating it would leave the files
+    # other workers are still inserting stuck at PROCESSING.
+    ctx = multiprocessing.get_context("spawn")
+    failed: list[str] = []
+    with ctx.Pool(processes=workers, initializer=_init_worker) as pool:
+        worker = functools.partial(_insert_path, file_kwargs=file_kwargs)
+        for fp, error in tqdm(pool.imap_unordered(worker, md_files), total=len(md_files)):
+            if error is not None:
+                print(f"Failed to insert file {fp}: {error}")
+                failed.append(fp)
+        pool.close()
+        pool.join()
+
+    if failed:
+        print(f"{len(failed)} of {len(md_files)} files failed to insert.")
+        exit(1)
@@ -1,5 +1,7 @@
 from .generator import Generator
-from .reranker import Reranker
-from .embedder import Embedder
+from .reranker import Reranker, get_reranker
+from .embedder import Embedder, get_embedder
+from .tokenization import clear_tokenizer_cache
 
-__all__ = ["Generator", "Reranker", "Embedder"]
\ No newline at end of file
+__all__ = ["Generator", "Reranker", "Embedder", "clear_tokenizer_cache",
+           "get_embedder", "get_reranker"]
@@ -1,8 +1,14 @@
+import base64
+from functools import lru_cache
 from typing import List
 import openai
 import os
 import urllib.parse
-import requests
+from . import tokenization
+from .http_pool import build_session, build_openai_http_client
+import httpx
+import numpy as np
+import orjson
 from typing import Tuple
 
 ENV_EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL")
@@ -14,15 +20,18 @@ ENV_EMBEDDING_KEY = os.getenv("EMBEDDING_KEY", "default_key")
 class Embedder:
     def __init__(self, base_url: str = ENV_EMBEDDING_BASE_URL, model: str = ENV_EMBEDDING_MODEL, key: str = ENV_EMBEDDING_KEY):
         self.base_url = base_url
-        self.client = openai.OpenAI(base_url=urllib.parse.urljoin(base_url, "v1"), api_key=key)
+        # Shared by the SDK and the raw embeddings path below (one connection pool)
+        self.http_client = build_openai_http_client()
+        self.client = openai.OpenAI(base_url=urllib.parse.urljoin(base_url, "v1"), api_key=key,
+                                    http_client=self.http_client)
+        self.embeddings_url = urllib.parse.urljoin(base_url, "v1/embeddings")
+        # Flipped off once a request the server rejected with encoding_format="base64"
+        # succeeds without it
+        self.base64_embeddings = True
         self.model = model
         self.key = key
         # Initialize a raw requests session for auxiliary endpoints that are not covered by the OpenAI SDK
-        self.session = requests.Session()
-        self.session.headers.update({
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json",
-        })
+        self.session = build_session(key)
 
         # # Check if server is up upon initialization
         # health_url = urllib.parse.urljoin(self.base_url, "health")
@@ -40,6 +49,52 @@ class Embedder:
         )
         return [embedding.embedding for embedding in response.data]
 
+    def embed_batch_ndarray(self, batch: List[str]) -> np.ndarray:
+        """Embed *batch* into a contiguous ``(len(batch), dim)`` float32 array.
+
+        Posts to ``/v1/embeddings`` directly and parses the body with orjson,
+        skipping the SDK's per-item pydantic models and float lists. Vectors
+        are requested as base64 float32 bytes (about a quarter of the JSON
+        size) unless the server has refused that format before.
+        """
+        body = {"model": self.model, "input": batch}
+        if self.base64_embeddings:
+            response = self._post_embeddings({**body, "encoding_format": "base64"})
+            if response.status_code in (400, 422):
+                # Possibly a server that only speaks float lists; the input
+                # itself may also be at fault, so only a successful float
+                # retry turns base64 off for good.
+                response = self._post_embeddings(body)
+                if response.is_success:
+                    self.base64_embeddings = False
+        else:
+            response = self._post_embeddings(body)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Embedding request failed: {e}")
+        data = orjson.loads(response.content).get("data")
+        if not isinstance(data, list) or len(data) != len(batch):
+            raise ValueError(f"Unexpected embedding response format: {data}")
+        if not data:
+            return np.empty((0, 0), dtype=np.float32)
+        data.sort(key=lambda item: item["index"])
+        return np.stack([self._decode_embedding(item["embedding"]) for item in data])
+
+    def _post_embeddings(self, body: dict) -> httpx.Response:
+        return self.http_client.post(
+            self.embeddings_url,
+            content=orjson.dumps(body),
+            headers={"Authorization": f"Bearer {self.key}", "Content-Type": "application/json"},
+        )
+
+    @staticmethod
+    def _decode_embedding(embedding: str | List[float]) -> np.ndarray:
+        # Servers that ignore encoding_format still answer with float lists
+        if isinstance(embedding, str):
+            return np.frombuffer(base64.b64decode(embedding), dtype=np.float32)
+        return np.asarray(embedding, dtype=np.float32)
+
     def embed(self, batch: List[str] | str) -> List[List[float]] | List[float]:
         if isinstance(batch, str):
             return self.embed_batch([batch])[0]
@@ -50,15 +105,13 @@ class Embedder:
         return self.embed(batch)
 
     def count_tokens(self, text: str) -> Tuple[int, int]:
-        response = self.session.post(urllib.parse.urljoin(self.base_url, "tokenize"), json={
-            "model": self.model,
-            "prompt": text
-        })
-        try:
-            response.raise_for_status()
-        except requests.RequestException as e:
-            raise RuntimeError(f"Token count request failed: {e}")
-        data = response.json()
-        if "count" not in data or "max_model_len" not in data:
-            raise ValueError(f"Unexpected token count response format: {data}")
-        return data["count"], data["max_model_len"]
+        return tokenization.count_tokens(self.session, self.base_url, self.model, text)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[Tuple[int, int]]:
+        return tokenization.count_tokens_batch(self.session, self.base_url, self.model, texts)
+
+
+@lru_cache(maxsize=None)
+def get_embedder() -> Embedder:
+    """Process-wide :class:`Embedder` built from the environment, shared by its connection pools."""
+    return Embedder()
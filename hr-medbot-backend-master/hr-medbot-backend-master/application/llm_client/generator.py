@@ -2,7 +2,8 @@ from typing import List, Generator, Dict, Tuple
 import openai
 import os
 import urllib.parse
-import requests
+from . import tokenization
+from .http_pool import build_session, build_openai_http_client, GENERATION_TIMEOUT_S
 
 
 ENV_GENERATOR_BASE_URL = os.getenv("GENERATOR_BASE_URL")
@@ -15,17 +16,14 @@ ENV_GENERATOR_KEY = os.getenv("GENERATOR_KEY", "default_key")
 class Generator:
     def __init__(self, base_url: str = ENV_GENERATOR_BASE_URL, model: str = ENV_GENERATOR_MODEL, key: str = ENV_GENERATOR_KEY, temperature: float = 0.7, max_tokens: int = 1000):
         self.base_url = base_url
-        self.client = openai.OpenAI(base_url=urllib.parse.urljoin(base_url, "v1"), api_key=key)
+        self.client = openai.OpenAI(base_url=urllib.parse.urljoin(base_url, "v1"), api_key=key,
+                                    http_client=build_openai_http_client(GENERATION_TIMEOUT_S))
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.key = key
         # Raw requests session for auxiliary endpoints not covered by the OpenAI SDK
-        self.session = requests.Session()
-        self.session.headers.update({
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json",
-        })
+        self.session = build_session(key)
 
         # # Check if server is up upon initialization
         # health_url = urllib.parse.urljoin(self.base_url, "health")
@@ -54,20 +52,22 @@ class Generator:
             if choice.text:
                 yield choice.text
     
-    def chat_completion(self, messages: List[Dict[str, str]], stream: bool = False) -> Generator[str, None, None] | str:
+    def chat_completion(self, messages: List[Dict[str, str]], stream: bool = False, *,
+                        max_tokens: int | None = None) -> Generator[str, None, None] | str:
         response = self.client.chat.completions.create(model=self.model,
                                                        messages=messages,
                                                        stream=stream,
                                                        temperature=self.temperature,
-                                                       max_tokens=self.max_tokens,
+                                                       max_tokens=max_tokens or self.max_tokens,
                                                        )
         if stream:
             return self.__stream_response(response)
         else:
             return response.choices[0].message.content
     
-    def __call__(self, messages: List[Dict[str, str]], stream: bool = False) -> Generator[str, None, None] | str:
-        return self.chat_completion(messages, stream)
+    def __call__(self, messages: List[Dict[str, str]], stream: bool = False, *,
+                 max_tokens: int | None = None) -> Generator[str, None, None] | str:
+        return self.chat_completion(messages, stream, max_tokens=max_tokens)
 
     def invoke(self, prompt: str, stream: bool = False) -> Generator[str, None, None] | str:
         response = self.client.completions.create(model=self.model,
@@ -82,29 +82,10 @@ class Generator:
             return response.choices[0].text
 
     def count_conversation_tokens(self, messages: List[Dict[str, str]]) -> Tuple[int, int]:
-        response = self.session.post(urllib.parse.urljoin(self.base_url, "tokenize"), json={
-                "model": self.model,
-                "messages": messages
-        })
-        try:
-            response.raise_for_status()
-        except requests.RequestException as e:
-            raise RuntimeError(f"Token count request failed: {e}")
-        data = response.json()
-        if "count" not in data or "max_model_len" not in data:
-            raise ValueError(f"Unexpected token count response format: {data}")
-        return data["count"], data["max_model_len"]
+        return tokenization.count_conversation_tokens(self.session, self.base_url, self.model, messages)
 
     def count_tokens(self, text: str) -> Tuple[int, int]:
-        response = self.session.post(urllib.parse.urljoin(self.base_url, "tokenize"), json={
-            "model": self.model,
-            "prompt": text
-        })
-        try:
-            response.raise_for_status()
-        except requests.RequestException as e:
-            raise RuntimeError(f"Token count request failed: {e}")
-        data = response.json()
-        if "count" not in data or "max_model_len" not in data:
-            raise ValueError(f"Unexpected token count response format: {data}")
-        return data["count"], data["max_model_len"]
+        return tokenization.count_tokens(self.session, self.base_url, self.model, text)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[Tuple[int, int]]:
+        return tokenization.count_tokens_batch(self.session, self.base_url, self.model, texts)
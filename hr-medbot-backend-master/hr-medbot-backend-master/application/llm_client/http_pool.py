@@ -0,0 +1,51 @@
+"""Shared HTTP connection-pool settings for the LLM clients."""
+import os
+
+import httpx
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("LLM_HTTP_POOL_CONNECTIONS", "64"))
+HTTP_POOL_MAXSIZE = int(os.getenv("LLM_HTTP_POOL_MAXSIZE", "256"))
+HTTP_TIMEOUT_S = float(os.getenv("LLM_HTTP_TIMEOUT_S", "60"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT_S", "5"))
+# Long non-streaming completions need the OpenAI SDK's own 10 minute read timeout
+GENERATION_TIMEOUT_S = float(os.getenv("LLM_GENERATION_TIMEOUT_S", "600"))
+
+
+def build_session(key: str) -> requests.Session:
+    """Return a bearer-authenticated ``requests.Session`` with a pooled adapter.
+
+    Connection failures and 502/503/504 replies are retried with backoff.
+    POST is retried too: every call on these sessions (tokenize, rerank) is a
+    read-only scoring request, so replaying one is harmless.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=False,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                          allowed_methods=frozenset({"POST"}), raise_on_status=False),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Authorization": f"Bearer {key}",
+        "Content-Type": "application/json",
+    })
+    return session
+
+
+def build_openai_http_client(timeout_s: float = HTTP_TIMEOUT_S) -> httpx.Client:
+    """Return the httpx client handed to ``openai.OpenAI``, sized for concurrency.
+
+    *timeout_s* bounds reads; connecting to the server is always bounded by
+    ``HTTP_CONNECT_TIMEOUT_S``.
+    """
+    return openai.DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE // 2),
+        timeout=httpx.Timeout(timeout_s, connect=HTTP_CONNECT_TIMEOUT_S),
+    )
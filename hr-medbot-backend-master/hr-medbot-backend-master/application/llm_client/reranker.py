@@ -1,24 +1,37 @@
 import requests
 import os
+from functools import lru_cache
 from typing import List, Tuple
 import urllib.parse
+from . import tokenization
+from .http_pool import build_session
 
 
 ENV_RERANKER_BASE_URL = os.getenv("RERANKER_BASE_URL")
 ENV_RERANKER_MODEL = os.getenv("RERANKER_MODEL")
 ENV_RERANKER_KEY = os.getenv("RERANKER_KEY", "default_key")
 
+def _in_candidate_order(results: List[Tuple[int, float]], count: int) -> List[Tuple[int, float]]:
+    """Put ``(index, score)`` pairs back in the original candidate order.
+
+    The server answers by relevance; indices are unique, so a slot fill is O(n)
+    where a sort would be O(n log n). Indices outside the candidate range are
+    dropped.
+    """
+    slots: List[Tuple[int, float] | None] = [None] * count
+    for result in results:
+        if 0 <= result[0] < count:
+            slots[result[0]] = result
+    return [result for result in slots if result is not None]
+
+
 class Reranker:
     def __init__(self, base_url: str = ENV_RERANKER_BASE_URL, model: str = ENV_RERANKER_MODEL, key: str = ENV_RERANKER_KEY):
         self.base_url = base_url        
         self.rerank_url = urllib.parse.urljoin(self.base_url, "v1/rerank")
         self.model = model
         self.key = key
-        self.client = requests.Session()
-        self.client.headers.update({
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json",
-        })
+        self.client = build_session(key)
 
         # # Check if server is up upon initialization
         # health_url = urllib.parse.urljoin(self.base_url, "health")
@@ -54,23 +67,19 @@ class Reranker:
         for i in range(0, len(candidates), batch_size):
             batch = candidates[i:i+batch_size]
             results.extend(self._rerank(query, batch, i))
-        # keep the original order of the candidates
-        return sorted(results, key=lambda x: x[0])
+        return _in_candidate_order(results, len(candidates))
     
     def count_tokens(self, text: str) -> Tuple[int, int]:
-        response = self.client.post(urllib.parse.urljoin(self.base_url, "tokenize"), json={
-            "model": self.model,
-            "prompt": text
-        })
-        try:
-            response.raise_for_status()
-        except requests.RequestException as e:
-            raise RuntimeError(f"Token count request failed: {e}")
-        data = response.json()
-        if "count" not in data or "max_model_len" not in data:
-            raise ValueError(f"Unexpected token count response format: {data}")
-        return data["count"], data["max_model_len"]
+        return tokenization.count_tokens(self.client, self.base_url, self.model, text)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[Tuple[int, int]]:
+        return tokenization.count_tokens_batch(self.client, self.base_url, self.model, texts)
 
     def __call__(self, query: str, candidates: List[str], batch_size: int = 128) -> List[Tuple[int, float]]:
         return self.rerank(query, candidates, batch_size)
 
+
+@lru_cache(maxsize=None)
+def get_reranker() -> Reranker:
+    """Process-wide :class:`Reranker` built from the environment, shared by its connection pool."""
+    return Reranker()
@@ -0,0 +1,135 @@
+"""Cached access to the vLLM ``/tokenize`` endpoint shared by the LLM clients."""
+import hashlib
+import json
+import threading
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import requests
+
+TOKENIZER_CACHE_SIZE = 8192
+# Fan-out width when the server has no batch tokenize endpoint
+TOKENIZE_BATCH_WORKERS = 16
+
+# (tokenize url, model, content digest) -> (count, max_model_len)
+_token_cache: "OrderedDict[tuple[str, str | None, bytes], Tuple[int, int]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+# Batch tokenize urls that answered 404/405, so later batches go straight to the fan-out
+_batch_unsupported: set[str] = set()
+
+
+def clear_tokenizer_cache() -> None:
+    """Drop every memoized token count."""
+    with _token_cache_lock:
+        _token_cache.clear()
+
+
+def _digest(payload: bytes) -> bytes:
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def _post_tokenize(session: requests.Session, url: str, body: dict) -> Tuple[int, int]:
+    response = session.post(url, json=body)
+    try:
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise RuntimeError(f"Token count request failed: {e}")
+    data = response.json()
+    if "count" not in data or "max_model_len" not in data:
+        raise ValueError(f"Unexpected token count response format: {data}")
+    return data["count"], data["max_model_len"]
+
+
+def _post_tokenize_batch(session: requests.Session, url: str, model: str | None,
+                         texts: List[str]) -> List[Tuple[int, int]] | None:
+    # Returns None when the server does not expose the batch endpoint
+    response = session.post(url, json={"model": model, "prompts": texts})
+    if response.status_code in (404, 405):
+        return None
+    try:
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise RuntimeError(f"Token count request failed: {e}")
+    results = response.json().get("results")
+    if not isinstance(results, list) or len(results) != len(texts):
+        raise ValueError(f"Unexpected batch token count response format: {results}")
+    return [(d["count"], d["max_model_len"]) for d in results]
+
+
+def _store(key, result: Tuple[int, int]) -> None:
+    with _token_cache_lock:
+        _token_cache[key] = result
+        _token_cache.move_to_end(key)
+        if len(_token_cache) > TOKENIZER_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+
+def _cached(key, fetch) -> Tuple[int, int]:
+    with _token_cache_lock:
+        hit = _token_cache.get(key)
+        if hit is not None:
+            _token_cache.move_to_end(key)
+            return hit
+    result = fetch()
+    _store(key, result)
+    return result
+
+
+def count_tokens(session: requests.Session, base_url: str, model: str | None, text: str) -> Tuple[int, int]:
+    """Return ``(count, max_model_len)`` for *text*, memoized on its digest."""
+    url = urllib.parse.urljoin(base_url, "tokenize")
+    key = (url, model, _digest(b"p" + text.encode("utf-8")))
+    return _cached(key, lambda: _post_tokenize(session, url, {"model": model, "prompt": text}))
+
+
+def count_tokens_batch(session: requests.Session, base_url: str, model: str | None,
+                       texts: List[str]) -> List[Tuple[int, int]]:
+    """Return ``(count, max_model_len)`` for each of *texts*, in order.
+
+    Cache misses go to ``/tokenize_batch`` in one request; servers without it
+    (plain vLLM answers 404) are queried per text in parallel instead.
+    """
+    url = urllib.parse.urljoin(base_url, "tokenize")
+    keys = [(url, model, _digest(b"p" + text.encode("utf-8"))) for text in texts]
+    results: List[Tuple[int, int] | None] = [None] * len(texts)
+    missing: Dict[tuple, List[int]] = {}
+    with _token_cache_lock:
+        for i, key in enumerate(keys):
+            hit = _token_cache.get(key)
+            if hit is not None:
+                _token_cache.move_to_end(key)
+                results[i] = hit
+            else:
+                missing.setdefault(key, []).append(i)
+    if not missing:
+        return results
+
+    todo = [texts[positions[0]] for positions in missing.values()]
+    batch_url = urllib.parse.urljoin(base_url, "tokenize_batch")
+    fetched = None
+    if batch_url not in _batch_unsupported:
+        fetched = _post_tokenize_batch(session, batch_url, model, todo)
+        if fetched is None:
+            _batch_unsupported.add(batch_url)
+    if fetched is None:
+        workers = min(TOKENIZE_BATCH_WORKERS, len(todo))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = list(executor.map(
+                lambda text: _post_tokenize(session, url, {"model": model, "prompt": text}), todo))
+
+    for (key, positions), result in zip(missing.items(), fetched):
+        _store(key, result)
+        for i in positions:
+            results[i] = result
+    return results
+
+
+def count_conversation_tokens(session: requests.Session, base_url: str, model: str | None,
+                              messages: List[Dict[str, str]]) -> Tuple[int, int]:
+    """Return ``(count, max_model_len)`` for chat *messages*, memoized on their digest."""
+    url = urllib.parse.urljoin(base_url, "tokenize")
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    key = (url, model, _digest(b"m" + payload))
+    return _cached(key, lambda: _post_tokenize(session, url, {"model": model, "messages": messages}))
@@ -1,12 +1,105 @@
-from collections import defaultdict
-from math import inf
-from sqlalchemy import select, and_, func
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from sqlalchemy import select, and_, func, union_all, cast, null, bindparam, Float
 from sqlalchemy.orm import joinedload
-from database import models, session_scope
-from llm_client import Embedder, Reranker
+from pgvector.sqlalchemy import Vector
+from database import models, session_scope, ann_session, HNSW_EF_SEARCH
+from llm_client import Embedder, Reranker, get_embedder, get_reranker
 from typing import List, Dict, Any
 
 
+RERANK_CACHE_SIZE = 4096
+
+# (reranker model, query digest, chunk text digest) -> rerank score, shared by all retrievers
+_rerank_cache: "OrderedDict[tuple[str | None, bytes, bytes], float]" = OrderedDict()
+_rerank_cache_lock = threading.Lock()
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class _QueryVector(Vector):
+    """``Vector`` bind type that leaves ndarrays to the driver's binary pgvector dumper under psycopg 3."""
+
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        if dialect.driver == "psycopg":
+            return None
+        return super().bind_processor(dialect)
+
+
+@lru_cache(maxsize=256)
+def _access_control_filters(fingerprint: frozenset) -> tuple:
+    """``File`` array-overlap filters for an access-control fingerprint, built once per fingerprint."""
+    return tuple(getattr(models.File, ac_k).op("&&")(list(ac_v)) for ac_k, ac_v in sorted(fingerprint))
+
+
+def _submodel_similarity_cte(db_model, fetch_limit, query_embedding, name: str, access_filters: tuple):
+    """Nearest ``fetch_limit`` rows of *db_model* as a ``(big_chunk_id, distance)`` CTE.
+
+    Ordering by the bare ``<=>`` distance lets the planner use the HNSW
+    ``vector_cosine_ops`` index on the embedding column.
+    """
+    base_distance = db_model.embedding.cosine_distance(query_embedding)
+    query = (
+        select(db_model.big_chunk_id.label('big_chunk_id'), base_distance.label('distance'))
+        .join(models.BigChunk, models.BigChunk.id == db_model.big_chunk_id)
+        .join(models.File, models.File.id == models.BigChunk.file_id)
+        .where(models.File.status == models.FileStatus.OK)
+    )
+    if access_filters:
+        query = query.where(and_(*access_filters))
+    return query.order_by(base_distance).limit(fetch_limit).cte(name)
+
+
+@lru_cache(maxsize=256)
+def _top_big_chunks_stmt(summary_limit: int, small_chunk_limit: int, prefetch_limit: int, alpha: float,
+                         access_fingerprint: frozenset):
+    """The fused retrieval query with the query embedding as a bind parameter.
+
+    Built once per retriever configuration and shared by all retrievers
+    (ChatSystem builds one per request), so each retrieval skips constructing
+    the statement and reuses the compiled SQL from SQLAlchemy's cache.
+    """
+    access_filters = _access_control_filters(access_fingerprint)
+    query_embedding = bindparam("query_embedding", type_=_QueryVector(models.DB_VECTOR_DIMENSION))
+    summaries = _submodel_similarity_cte(models.BigChunkSummary, summary_limit, query_embedding, "summary_hits", access_filters)
+    small_chunks = _submodel_similarity_cte(models.SmallChunk, small_chunk_limit, query_embedding, "small_chunk_hits", access_filters)
+    hits = union_all(
+        select(summaries.c.big_chunk_id, summaries.c.distance.label('summary_distance'), cast(null(), Float).label('small_chunk_distance')),
+        select(small_chunks.c.big_chunk_id, cast(null(), Float), small_chunks.c.distance),
+    ).subquery("hits")
+    summary_score = 1 - func.min(hits.c.summary_distance)  # dist to similarity
+    small_chunk_score = 1 - func.min(hits.c.small_chunk_distance)
+    combined_score = (
+        alpha * func.coalesce(small_chunk_score, 0.0)
+        + (1 - alpha) * func.coalesce(summary_score, 0.0)
+    )
+    scored = (
+        select(
+            hits.c.big_chunk_id,
+            summary_score.label('summary_score'),
+            small_chunk_score.label('small_chunk_score'),
+            combined_score.label('combined_score'),
+        )
+        .group_by(hits.c.big_chunk_id)
+        .order_by(combined_score.desc())
+        .limit(prefetch_limit)
+        .subquery("scored")
+    )
+    return (
+        select(models.BigChunk, scored.c.summary_score, scored.c.small_chunk_score, scored.c.combined_score)
+        .join(scored, models.BigChunk.id == scored.c.big_chunk_id)
+        .options(joinedload(models.BigChunk.file))
+        .order_by(scored.c.combined_score.desc())
+    )
+
+
 class AugmentedRetriever:
     def __init__(self,
                  limit: int = 5,
@@ -15,104 +108,150 @@ class AugmentedRetriever:
                  access_control_fields: dict | None = None,
                  alpha: float = 0.5,
                  summary_limit: int = 10,
-                 small_chunk_limit: int = 50):
+                 small_chunk_limit: int = 50,
+                 rerank_k: int | None = None,
+                 cache_rerank_scores: bool = True,
+                 embedder: Embedder | None = None,
+                 reranker: Reranker | None = None):
         self.limit = limit
         self.prefetch_limit = prefetch_limit
+        # only the best rerank_k candidates by combined score go to the reranker;
+        # by default halfway between limit and prefetch_limit, so pruning actually happens
+        self.rerank_k = rerank_k if rerank_k is not None else max(limit, (limit + prefetch_limit) // 2)
+        self.cache_rerank_scores = cache_rerank_scores
         self.alpha = alpha
         self.summary_limit = summary_limit
         self.small_chunk_limit = small_chunk_limit
-        self.embedder = Embedder()
-        self.reranker = Reranker()
+        # shared clients unless injected, so building a retriever per request stays cheap
+        self.embedder = embedder or get_embedder()
+        self.reranker = reranker or get_reranker()
         self.access_control_fields = access_control_fields
-        self.access_filters = self._build_access_control_filters()
+        self.access_fingerprint = self._build_access_control_fingerprint()
+        self.access_filters = list(_access_control_filters(self.access_fingerprint))
     
     def __call__(self, query: str) -> List[Dict[str, Any]]:
         return self.retrieve(query)
 
     def retrieve(self, query: str) -> List[Dict[str, Any]]:
         query_embedding = self.embedder(query)
+        top_big_chunks, summary_scores, small_chunk_scores, big_chunk_scores = self._load_top_big_chunks(query_embedding)
+        reranked_chunks, rerank_scores = self._rerank_chunks_with_scores(query, top_big_chunks)
+        return self._build_results(reranked_chunks, rerank_scores, summary_scores, small_chunk_scores, big_chunk_scores)
+
+    def _build_results(self, reranked_chunks, rerank_scores, summary_scores, small_chunk_scores, big_chunk_scores) -> List[Dict[str, Any]]:
+        results = []
+        for i, chunk in enumerate(reranked_chunks[:self.limit]):
+            chunk_id = chunk.id
+            summary_score = summary_scores.get(chunk_id, 0.0)
+            small_chunk_score = small_chunk_scores.get(chunk_id, 0.0)
+            combined_score = big_chunk_scores.get(chunk_id, 0.0)
+            rerank_score = rerank_scores[i] if i < len(rerank_scores) else 0.0
+            results.append({
+                'chunk': chunk,
+                'summary_score': summary_score,
+                'small_chunk_score': small_chunk_score,
+                'combined_score': combined_score,
+                'rerank_score': rerank_score
+            })
+        return results
+
+    def _load_top_big_chunks(self, query_embedding):
+        # float32 is the column's own precision; converted once, bound by both ANN legs
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        # ef_search below the LIMIT of a leg would silently return fewer rows
+        ef_search = max(HNSW_EF_SEARCH, 2 * max(self.summary_limit, self.small_chunk_limit))
         with session_scope() as session:
-            summary_scores = self._get_submodel_similarity(session, models.BigChunkSummary, self.summary_limit, query_embedding)
-            small_chunk_scores = self._get_submodel_similarity(session, models.SmallChunk, self.small_chunk_limit, query_embedding)            
-            big_chunk_scores = self._merge_scores(summary_scores, small_chunk_scores)
-            top_big_chunks = self._get_top_big_chunks(session, big_chunk_scores)
-            reranked_chunks, rerank_scores = self._rerank_chunks_with_scores(query, top_big_chunks)
-            results = []
-            for i, chunk in enumerate(reranked_chunks[:self.limit]):
-                chunk_id = chunk.id
-                summary_score = summary_scores.get(chunk_id, 0.0)
-                small_chunk_score = small_chunk_scores.get(chunk_id, 0.0)
-                combined_score = big_chunk_scores.get(chunk_id, 0.0)
-                rerank_score = rerank_scores[i] if i < len(rerank_scores) else 0.0
-                results.append({
-                    'chunk': chunk,
-                    'summary_score': summary_score,
-                    'small_chunk_score': small_chunk_score,
-                    'combined_score': combined_score,
-                    'rerank_score': rerank_score
-                })
-            return results
-
-    def _merge_scores(self, summary_scores, small_chunk_scores) -> Dict[str, float]:
-        combined_scores = defaultdict(float)
-        for big_chunk_id, score in small_chunk_scores.items():
-            combined_scores[big_chunk_id] += self.alpha * score
-        for big_chunk_id, score in summary_scores.items():
-            combined_scores[big_chunk_id] += (1 - self.alpha) * score
-        
-        return dict(combined_scores)
-    
-    def _build_access_control_filters(self) -> List:
-        filters = []
+            with ann_session(session, ef_search):
+                return self._get_top_big_chunks(session, query_embedding)
+
+    def _build_access_control_fingerprint(self) -> frozenset:
         if not self.access_control_fields:
-            return filters
-        for ac_k, ac_v in self.access_control_fields.items():
+            return frozenset()
+        for ac_v in self.access_control_fields.values():
             assert isinstance(ac_v, list), "Only lists accepted as values in access control"
-            col = getattr(models.File, ac_k)
-            filters.append(col.op("&&")(ac_v))
-        return filters
-
-    def _get_submodel_similarity(self, session, db_model, fetch_limit, query_embedding):
-        base_distance = db_model.embedding.cosine_distance(query_embedding)
-        query = (
-            select(db_model.big_chunk_id, base_distance.label('distance'))
-            .join(models.BigChunk, models.BigChunk.id == db_model.big_chunk_id)
-            .join(models.File, models.File.id == models.BigChunk.file_id)
-            .where(models.File.status == models.FileStatus.OK)
-        )
-        if self.access_filters:
-            query = query.where(and_(*self.access_filters))
-        query = query.order_by(base_distance).limit(fetch_limit)
-        results = session.execute(query).fetchall()
-        scores = defaultdict(lambda: float('-inf'))
-        for row in results:
-            scores[row.big_chunk_id] = 1 - row.distance # dist to similarity
-        return scores
-
-    def _get_top_big_chunks(self, session, big_chunk_scores: Dict[str, float] ) -> List[models.BigChunk]:
-        """Get the top big chunks by combined similarity score."""
-        if not big_chunk_scores:
-            return []
-        sorted_chunks = sorted(big_chunk_scores.items(), key=lambda x: x[1], reverse=True)
-        top_chunk_ids = [chunk_id for chunk_id, _ in sorted_chunks[:self.prefetch_limit]]
-        query = select(models.BigChunk).where(
-            models.BigChunk.id.in_(top_chunk_ids)
-        ).options(joinedload(models.BigChunk.file))
-        big_chunks = session.execute(query).scalars().all()
-        chunk_dict = {chunk.id: chunk for chunk in big_chunks}
-        return [chunk_dict[chunk_id] for chunk_id in top_chunk_ids if chunk_id in chunk_dict]
+        return frozenset((k, tuple(v)) for k, v in self.access_control_fields.items())
+
+    def _get_top_big_chunks(self, session, query_embedding):
+        """Score and fetch the top ``prefetch_limit`` big chunks in one query.
+
+        Both ANN legs (summaries and small chunks) run as CTEs, keep the best
+        hit per big chunk and are fused as ``alpha * small + (1 - alpha) *
+        summary`` server-side; the winning ``BigChunk`` rows come back with
+        their ``file`` eager-loaded. Returns the chunks in combined-score
+        order plus per-chunk summary, small-chunk and combined score maps.
+        """
+        stmt = _top_big_chunks_stmt(self.summary_limit, self.small_chunk_limit, self.prefetch_limit, self.alpha,
+                                    self.access_fingerprint)
+        rows = session.execute(stmt, {"query_embedding": query_embedding}).all()
+        big_chunks: List[models.BigChunk] = []
+        summary_scores: Dict[str, float] = {}
+        small_chunk_scores: Dict[str, float] = {}
+        big_chunk_scores: Dict[str, float] = {}
+        for chunk, summary, small_chunk, combined in rows:
+            big_chunks.append(chunk)
+            if summary is not None:
+                summary_scores[chunk.id] = summary
+            if small_chunk is not None:
+                small_chunk_scores[chunk.id] = small_chunk
+            big_chunk_scores[chunk.id] = combined
+        return big_chunks, summary_scores, small_chunk_scores, big_chunk_scores
 
     def _rerank_chunks_with_scores(self, query: str, big_chunks: List[models.BigChunk]) -> tuple[List[models.BigChunk], List[float]]:
         """Rerank big chunks using the reranker and return both chunks and scores."""
+        # big_chunks arrive in combined-score order, so this keeps the best candidates
+        big_chunks = big_chunks[:self.rerank_k]
         if not big_chunks:
             return [], []
-        candidates = [chunk.text for chunk in big_chunks]
-        rerank_scores = self.reranker.rerank(query, candidates)
-        chunk_score_pairs = list(zip(big_chunks, [score for _, score in rerank_scores]))
-        chunk_score_pairs.sort(key=lambda x: x[1], reverse=True)
-        reranked_chunks = [chunk for chunk, _ in chunk_score_pairs]
-        scores = [score for _, score in chunk_score_pairs]
-        return reranked_chunks, scores
+        texts = [chunk.text for chunk in big_chunks]
+        keys, scores, missing = self._lookup_rerank_scores(self.reranker.model, query, texts)
+        if missing:
+            fetched = self.reranker.rerank(query, [texts[i] for i in missing])
+            self._store_rerank_scores(keys, scores, missing, fetched)
+        return self._order_by_rerank(big_chunks, self._known_scores(scores))
+
+    def _lookup_rerank_scores(self, model, query: str, texts: List[str]):
+        """Return cache keys, per-text scores (``None`` if unknown) and the indices still to rerank."""
+        if not self.cache_rerank_scores:
+            return None, [None] * len(texts), list(range(len(texts)))
+        query_digest = _digest(query)
+        keys = [(model, query_digest, _digest(text)) for text in texts]
+        scores: List[float | None] = []
+        with _rerank_cache_lock:
+            for key in keys:
+                score = _rerank_cache.get(key)
+                if score is not None:
+                    _rerank_cache.move_to_end(key)
+                scores.append(score)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        return keys, scores, missing
+
+    @staticmethod
+    def _store_rerank_scores(keys, scores: List[float | None], missing: List[int], fetched) -> None:
+        # fetched indices refer to the positions within the missing sub-list
+        for j, score in fetched:
+            scores[missing[j]] = score
+        if keys is None:
+            return
+        with _rerank_cache_lock:
+            for j, score in fetched:
+                key = keys[missing[j]]
+                _rerank_cache[key] = score
+                _rerank_cache.move_to_end(key)
+            while len(_rerank_cache) > RERANK_CACHE_SIZE:
+                _rerank_cache.popitem(last=False)
+
+    @staticmethod
+    def _known_scores(scores: List[float | None]) -> List[tuple[int, float]]:
+        return [(i, score) for i, score in enumerate(scores) if score is not None]
+
+    @staticmethod
+    def _order_by_rerank(big_chunks: List[models.BigChunk], rerank_scores) -> tuple[List[models.BigChunk], List[float]]:
+        count = len(rerank_scores)
+        indices = np.fromiter((i for i, _ in rerank_scores), dtype=np.intp, count=count)
+        scores = np.fromiter((score for _, score in rerank_scores), dtype=np.float64, count=count)
+        # stable on the negated scores == descending sort keeping tie order
+        order = np.argsort(-scores, kind="stable")
+        return [big_chunks[i] for i in indices[order]], scores[order].tolist()
 
 
 
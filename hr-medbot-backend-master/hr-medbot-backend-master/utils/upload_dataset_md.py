@@ -1,18 +1,30 @@
 from __future__ import annotations
 
+import base64
+import fnmatch
 import json
 import os
 import random
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, TextIO
 
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from urllib3.util.retry import Retry
+
+try:  # streams the multipart body instead of buffering the whole file
+    from requests_toolbelt import MultipartEncoder
+except ImportError:  # pragma: no cover - optional dependency
+    MultipartEncoder = None
 
 # ---------------------------------------------------------------------------
 # Purpose: Upload markdown files from data_playground/dataset/ to the
@@ -25,10 +37,13 @@ from tqdm import tqdm
 #     KB_PASSWORD=bot-admin-1337
 #
 #   Run: python utils/upload_dataset_md.py
+#   (optional: pip install requests-toolbelt to stream uploads from disk)
 #
 # Features:
-#   - Resumes from last checkpoint (upload_progress.jsonl)
-#   - Handles server busy states and network retries
+#   - Resumes from last checkpoint (upload_progress.jsonl + .done sidecar)
+#   - Handles server busy states (honouring Retry-After) and network retries
+#   - Uploads KB_MAX_CONCURRENCY files in parallel (default 8)
+#   - Largest files first to avoid stragglers (KB_UPLOAD_ORDER=alpha to disable)
 #   - Progress bar shows upload status
 # ---------------------------------------------------------------------------
 
@@ -50,6 +65,8 @@ DATASET_ROOT = DATA_ROOT_PARENT / "dataset"
 
 # Progress checkpoint file (JSONL). Safe to delete to re-upload everything.
 PROGRESS_FILE = DATA_ROOT_PARENT / "upload_progress.jsonl"
+# Sidecar with one uploaded rel_path per line; rebuilt from PROGRESS_FILE if missing.
+DONE_FILE = PROGRESS_FILE.with_suffix(".done")
 
 # Upload endpoint (do not change unless server routes changed)
 AUTH_TOKEN_PATH = "/auth/token"
@@ -59,11 +76,14 @@ UPLOAD_PATH = "/knowledgebase/upload"
 FILE_GLOB = "*.md"
 REQUEST_TIMEOUT_S = 60
 
-# Server-busy (queue full) handling
-BUSY_MAX_WAIT_S = 15 * 60  # total time to keep retrying on HTTP 503
+# Server-busy (queue full) and rate-limit handling
+BUSY_MAX_WAIT_S = 15 * 60  # total time to keep retrying on HTTP 503 / 429
 BUSY_BASE_SLEEP_S = 5
 BUSY_MAX_SLEEP_S = 30
 
+# Upper bound on a server-provided Retry-After wait
+RETRY_AFTER_MAX_S = 120
+
 # Network retry handling
 NET_MAX_RETRIES = 5
 NET_BASE_SLEEP_S = 2
@@ -72,6 +92,19 @@ NET_MAX_SLEEP_S = 20
 # Optional pacing between successful uploads (helps avoid hammering)
 SUCCESS_SLEEP_S = 0.0
 
+# Pending upload order: "size_desc" (largest first, fewer stragglers) or "alpha"
+UPLOAD_ORDER = os.getenv("KB_UPLOAD_ORDER", "size_desc")
+
+# Renew the access token this many seconds before its JWT "exp"
+TOKEN_REFRESH_MARGIN_S = 60
+
+# Number of files uploaded in parallel
+MAX_CONCURRENCY = int(os.getenv("KB_MAX_CONCURRENCY", "8"))
+
+# HTTP connection pool (keep-alive connections reused across uploads)
+HTTP_POOL_CONNECTIONS = 64
+HTTP_POOL_MAXSIZE = 256
+
 
 @dataclass
 class ProgressRecord:
@@ -99,16 +132,41 @@ def _utc_ts() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _sleep_with_jitter(base_s: float, max_s: float, attempt: int) -> None:
+def _retry_after_s(resp: Response) -> float | None:
+    # Retry-After is either delta-seconds or an HTTP date
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), RETRY_AFTER_MAX_S)
+
+
+def _sleep_with_jitter(base_s: float, max_s: float, attempt: int, retry_after_s: float | None = None) -> None:
+    if retry_after_s:
+        # Server hint: small jitter only, so waiting clients don't all return at once
+        time.sleep(retry_after_s * (0.9 + random.random() * 0.2))
+        return
     # Exponential backoff with jitter, capped
     raw = min(max_s, base_s * (2 ** max(0, attempt - 1)))
     time.sleep(raw * (0.75 + random.random() * 0.5))
 
 
-def _load_already_uploaded(progress_path: Path) -> set[str]:
-    uploaded: set[str] = set()
+def _load_already_uploaded(progress_path: Path, done_path: Path) -> set[str]:
     if not progress_path.exists():
-        return uploaded
+        # Progress was reset: a leftover sidecar must not skip any file.
+        done_path.unlink(missing_ok=True)
+        return set()
+    # Fast path: plain path list, no JSON decoding
+    if done_path.exists():
+        return {line for line in done_path.read_text(encoding="utf-8").splitlines() if line}
+
+    uploaded: set[str] = set()
     with progress_path.open("r", encoding="utf-8") as fp:
         for line in fp:
             line = line.strip()
@@ -121,13 +179,29 @@ def _load_already_uploaded(progress_path: Path) -> set[str]:
             except Exception:
                 # Ignore malformed lines; keep going
                 continue
+    done_path.write_text("".join(f"{rel}\n" for rel in sorted(uploaded)), encoding="utf-8")
     return uploaded
 
 
-def _append_progress(progress_path: Path, rec: ProgressRecord) -> None:
-    progress_path.parent.mkdir(parents=True, exist_ok=True)
-    with progress_path.open("a", encoding="utf-8") as fp:
-        fp.write(json.dumps(rec.to_json(), ensure_ascii=False) + "\n")
+def _append_progress(progress_fp: TextIO, done_fp: TextIO, rec: ProgressRecord) -> None:
+    progress_fp.write(json.dumps(rec.to_json(), ensure_ascii=False) + "\n")
+    if rec.status == "uploaded":
+        done_fp.write(rec.rel_path + "\n")
+
+
+def _build_session() -> requests.Session:
+    # Pooled keep-alive connections; urllib3 only retries connection failures
+    # for POSTs, so an upload is never replayed (busy/503 is handled in main).
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=False,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
 def _url(path: str) -> str:
@@ -148,7 +222,71 @@ def _login(session: requests.Session) -> str:
     return str(token)
 
 
+def _jwt_exp(token: str) -> float | None:
+    # Reads the "exp" claim without verifying the signature (we only need the timing)
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except Exception:
+        return None
+
+
+class TokenHolder:
+    """Access token shared by all upload workers.
+
+    The token is stored as the session's default ``Authorization`` header and
+    renewed shortly before its JWT ``exp`` so workers rarely see a 401.
+    """
+
+    def __init__(self, session: requests.Session) -> None:
+        self._session = session
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self.token = ""
+        with self._lock:
+            self._set_token(_login(session))
+
+    def _set_token(self, token: str) -> None:
+        # Caller holds self._lock
+        self.token = token
+        self._session.headers["Authorization"] = f"Bearer {token}"
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        exp = _jwt_exp(token)
+        if exp is not None:
+            delay = exp - time.time() - TOKEN_REFRESH_MARGIN_S
+            if delay > 0:
+                self._timer = threading.Timer(delay, self._refresh_before_expiry, args=(token,))
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _refresh_before_expiry(self, token: str) -> None:
+        try:
+            self.refresh(token)
+        except Exception as exc:
+            # Workers still fall back to refreshing on 401/403
+            print(f"Proactive token refresh failed: {exc}", file=sys.stderr)
+
+    def refresh(self, stale_token: str) -> str:
+        # Only the first worker to see a rejected token logs in again; the
+        # others pick up the token it obtained.
+        with self._lock:
+            if self.token == stale_token:
+                self._set_token(_login(self._session))
+            return self.token
+
+    def close(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
 def _is_busy_response(resp: Response) -> bool:
+    if resp.status_code == 429:
+        return True
     if resp.status_code != 503:
         return False
     try:
@@ -158,9 +296,28 @@ def _is_busy_response(resp: Response) -> bool:
         return True
 
 
-def _iter_md_files(root: Path) -> Iterable[Path]:
+def _scan_md_files(root: Path) -> dict[Path, int]:
+    # Single walk: sizes come from the scandir entries, no second stat per file
+    sizes: dict[Path, int] = {}
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir():
+                    stack.append(Path(entry.path))
+                elif entry.is_file() and fnmatch.fnmatch(entry.name, FILE_GLOB):
+                    sizes[Path(entry.path)] = entry.stat().st_size
+    return sizes
+
+
+def _iter_md_files(sizes: dict[Path, int]) -> Iterable[Path]:
     # Deterministic order for stable resume behavior
-    yield from sorted(root.rglob(FILE_GLOB), key=lambda p: p.as_posix())
+    alpha = sorted(sizes, key=lambda p: p.as_posix())
+    if UPLOAD_ORDER == "alpha":
+        yield from alpha
+    else:
+        # Largest first (stable sort keeps path order between equal sizes)
+        yield from sorted(alpha, key=lambda p: -sizes[p])
 
 
 def _rel_title(path: Path) -> str:
@@ -170,21 +327,34 @@ def _rel_title(path: Path) -> str:
 
 def _upload_one(
     session: requests.Session,
-    token: str,
     file_path: Path,
     title: str,
 ) -> tuple[Response, dict[str, Any] | None]:
-    headers = {"Authorization": f"Bearer {token}"}
+    # Authorization comes from session.headers (kept current by TokenHolder)
     with file_path.open("rb") as fp:
-        files = {"uploaded_file": (file_path.name, fp, "text/markdown")}
-        data = {"title": title}
-        resp = session.post(
-            _url(UPLOAD_PATH),
-            headers=headers,
-            files=files,
-            data=data,
-            timeout=REQUEST_TIMEOUT_S,
-        )
+        if MultipartEncoder is not None:
+            # Body is read from disk in small blocks while sending (constant memory)
+            encoder = MultipartEncoder(
+                fields={
+                    "title": title,
+                    "uploaded_file": (file_path.name, fp, "text/markdown"),
+                }
+            )
+            resp = session.post(
+                _url(UPLOAD_PATH),
+                headers={"Content-Type": encoder.content_type},
+                data=encoder,
+                timeout=REQUEST_TIMEOUT_S,
+            )
+        else:
+            files = {"uploaded_file": (file_path.name, fp, "text/markdown")}
+            data = {"title": title}
+            resp = session.post(
+                _url(UPLOAD_PATH),
+                files=files,
+                data=data,
+                timeout=REQUEST_TIMEOUT_S,
+            )
     payload = None
     try:
         payload = resp.json()
@@ -193,6 +363,78 @@ def _upload_one(
     return resp, payload
 
 
+def _upload_with_retries(
+    session: requests.Session,
+    tokens: TokenHolder,
+    p: Path,
+    title: str,
+) -> ProgressRecord:
+    busy_start = time.time()
+    busy_attempt = 0
+
+    # network-level retries
+    net_attempt = 0
+    while True:
+        try:
+            token = tokens.token
+            resp, payload = _upload_one(session, p, title)
+
+            # Token expired / invalid: refresh and retry once
+            if resp.status_code in (401, 403):
+                tokens.refresh(token)
+                resp, payload = _upload_one(session, p, title)
+
+            # Queue full / server busy / rate limited: wait and retry until BUSY_MAX_WAIT_S
+            if _is_busy_response(resp):
+                if time.time() - busy_start > BUSY_MAX_WAIT_S:
+                    return ProgressRecord(
+                        rel_path=title,
+                        abs_path=str(p),
+                        status="failed",
+                        http_status=resp.status_code,
+                        error="server busy timeout",
+                        ts=_utc_ts(),
+                    )
+                busy_attempt += 1
+                _sleep_with_jitter(BUSY_BASE_SLEEP_S, BUSY_MAX_SLEEP_S, attempt=busy_attempt,
+                                   retry_after_s=_retry_after_s(resp))
+                continue
+
+            if resp.ok:
+                job_id = None
+                if isinstance(payload, dict):
+                    job_id = payload.get("job_id")
+                if SUCCESS_SLEEP_S > 0:
+                    time.sleep(SUCCESS_SLEEP_S)
+                return ProgressRecord(
+                    rel_path=title,
+                    abs_path=str(p),
+                    status="uploaded",
+                    http_status=resp.status_code,
+                    job_id=str(job_id) if job_id else None,
+                    ts=_utc_ts(),
+                )
+            return ProgressRecord(
+                rel_path=title,
+                abs_path=str(p),
+                status="failed",
+                http_status=resp.status_code,
+                error=(json.dumps(payload, ensure_ascii=False) if isinstance(payload, dict) else resp.text)[:2000],
+                ts=_utc_ts(),
+            )
+        except requests.RequestException as exc:
+            net_attempt += 1
+            if net_attempt > NET_MAX_RETRIES:
+                return ProgressRecord(
+                    rel_path=title,
+                    abs_path=str(p),
+                    status="failed",
+                    error=f"network error after retries: {exc}",
+                    ts=_utc_ts(),
+                )
+            _sleep_with_jitter(NET_BASE_SLEEP_S, NET_MAX_SLEEP_S, attempt=net_attempt)
+
+
 def main() -> int:
     if not DATASET_ROOT.exists():
         print(f"Dataset folder not found: {DATASET_ROOT}", file=sys.stderr)
@@ -202,8 +444,9 @@ def main() -> int:
         print("Missing KB_USERNAME or KB_PASSWORD (or edit USERNAME/PASSWORD globals).", file=sys.stderr)
         return 2
 
-    already = _load_already_uploaded(PROGRESS_FILE)
-    all_files = list(_iter_md_files(DATASET_ROOT))
+    PROGRESS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    already = _load_already_uploaded(PROGRESS_FILE, DONE_FILE)
+    all_files = list(_iter_md_files(_scan_md_files(DATASET_ROOT)))
     pending = [p for p in all_files if _rel_title(p) not in already]
 
     print(f"Base URL: {BASE_URL}")
@@ -212,91 +455,30 @@ def main() -> int:
     print(f"Total .md files: {len(all_files)}")
     print(f"Already uploaded: {len(already)}")
     print(f"Pending: {len(pending)}")
+    print(f"Concurrency: {MAX_CONCURRENCY}")
+    print(f"Order: {UPLOAD_ORDER}")
 
-    session = requests.Session()
-    token = _login(session)
-
-    with tqdm(total=len(pending), unit="file") as bar:
-        for p in pending:
-            title = _rel_title(p)
-            busy_start = time.time()
-
-            # network-level retries
-            net_attempt = 0
-            while True:
-                try:
-                    resp, payload = _upload_one(session, token, p, title)
-
-                    # Token expired / invalid: refresh and retry once
-                    if resp.status_code in (401, 403):
-                        token = _login(session)
-                        resp, payload = _upload_one(session, token, p, title)
-
-                    # Queue full / server busy: wait and retry until BUSY_MAX_WAIT_S
-                    if _is_busy_response(resp):
-                        if time.time() - busy_start > BUSY_MAX_WAIT_S:
-                            _append_progress(
-                                PROGRESS_FILE,
-                                ProgressRecord(
-                                    rel_path=title,
-                                    abs_path=str(p),
-                                    status="failed",
-                                    http_status=resp.status_code,
-                                    error="server busy timeout",
-                                    ts=_utc_ts(),
-                                ),
-                            )
-                            break
-                        _sleep_with_jitter(BUSY_BASE_SLEEP_S, BUSY_MAX_SLEEP_S, attempt=1)
-                        continue
-
-                    if resp.ok:
-                        job_id = None
-                        if isinstance(payload, dict):
-                            job_id = payload.get("job_id")
-                        _append_progress(
-                            PROGRESS_FILE,
-                            ProgressRecord(
-                                rel_path=title,
-                                abs_path=str(p),
-                                status="uploaded",
-                                http_status=resp.status_code,
-                                job_id=str(job_id) if job_id else None,
-                                ts=_utc_ts(),
-                            ),
-                        )
-                    else:
-                        _append_progress(
-                            PROGRESS_FILE,
-                            ProgressRecord(
-                                rel_path=title,
-                                abs_path=str(p),
-                                status="failed",
-                                http_status=resp.status_code,
-                                error=(payload if isinstance(payload, dict) else resp.text)[:2000],
-                                ts=_utc_ts(),
-                            ),
-                        )
-                    break
-                except requests.RequestException as exc:
-                    net_attempt += 1
-                    if net_attempt > NET_MAX_RETRIES:
-                        _append_progress(
-                            PROGRESS_FILE,
-                            ProgressRecord(
-                                rel_path=title,
-                                abs_path=str(p),
-                                status="failed",
-                                error=f"network error after retries: {exc}",
-                                ts=_utc_ts(),
-                            ),
-                        )
-                        break
-                    _sleep_with_jitter(NET_BASE_SLEEP_S, NET_MAX_SLEEP_S, attempt=net_attempt)
-
-            bar.update(1)
-            if SUCCESS_SLEEP_S > 0:
-                time.sleep(SUCCESS_SLEEP_S)
+    session = _build_session()
+    tokens = TokenHolder(session)
+
+    # Both files stay open (line-buffered) for the whole run.
+    try:
+        with (
+            PROGRESS_FILE.open("a", encoding="utf-8", buffering=1) as progress_fp,
+            DONE_FILE.open("a", encoding="utf-8", buffering=1) as done_fp,
+            ThreadPoolExecutor(max_workers=max(1, MAX_CONCURRENCY)) as executor,
+            tqdm(total=len(pending), unit="file") as bar,
+        ):
+            futures = [
+                executor.submit(_upload_with_retries, session, tokens, p, _rel_title(p))
+                for p in pending
+            ]
+            # Records are written from this thread only, so the JSONL stays consistent.
+            for fut in as_completed(futures):
+                _append_progress(progress_fp, done_fp, fut.result())
+                bar.update(1)
+    finally:
+        tokens.close()
 
     return 0
 
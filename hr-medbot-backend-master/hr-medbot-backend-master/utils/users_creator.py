@@ -2,125 +2,571 @@
 """Bulk-create users via the REST API.
 
 This helper authenticates as the *admin* account and reads users from a CSV file,
-then posts them to ``/administration/``.
+then posts them in batches to ``/administration/bulk`` (or one by one to
+``/administration/`` on servers without the bulk route).
 
 The CSV file should have the following columns:
 username, first_name, last_name, phone_number, email, password
 
 Adjust ``API_BASE_URL``, ``ADMIN_USERNAME`` and ``ADMIN_PASSWORD`` as needed.
+Up to ``MAX_CONCURRENCY`` users are posted at the same time, multiplexed over
+HTTP/2 when the ``h2`` package is installed and the API is served over https.
 """
 
 from __future__ import annotations
 
+import os
 import sys
 import csv
+import json
+import time
+import base64
+import random
+import asyncio
+import itertools
 import argparse
+import threading
+import concurrent.futures
 import httpx
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterator, List
+
+try:  # optional: lets httpx negotiate HTTP/2 (pip install h2)
+    import h2  # noqa: F401
+except ImportError:  # pragma: no cover - optional dependency
+    h2 = None
+
+try:  # optional: faster JSON encoding of request bodies (pip install orjson)
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:  # optional: fallback fast JSON encoder when orjson is missing (pip install msgspec)
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+if orjson is not None:
+    _encode_json = orjson.dumps
+elif msgspec is not None:
+    _encode_json = msgspec.json.Encoder().encode
+else:
+    _encode_json = None
 
 API_BASE_URL = "http://localhost:13537"  # Change if containerized / remote
+TOKEN_PATH = "/auth/token"  # Paths are resolved against the client's base_url
+ADMIN_PATH = "/administration/"
+BULK_PATH = "/administration/bulk"
+HEALTH_PATH = "/"  # The API root answers {"serive-status": "healthy"}
+HEALTH_TIMEOUT_S = 3.0
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "bot-admin-1337"
 DEFAULT_CSV_FILE = "users.csv"  # Default CSV file path
+USER_FIELDS = ("username", "first_name", "last_name", "phone_number", "email", "password")
+MAX_CONCURRENCY = 32  # Requests in flight at once
+QUEUE_SIZE = 64  # Batches buffered ahead of the POST workers
+PRODUCER_POLL_S = 0.5  # How often a blocked CSV reader checks that the workers are still running
+BULK_SIZE = 10  # Users per /administration/bulk request (~0.3 s of bcrypt each server-side)
+BULK_CONCURRENCY = 4  # Bulk requests in flight at once; the server hashes on its own cores
+BULK_READ_TIMEOUT_S = 120.0  # Read timeout for a bulk request, queued behind other batches' hashing
+RETRY_ATTEMPTS = 5  # Tries per request on connection failures, 429 and 503
+RETRY_BASE_S = 0.25  # First backoff delay, doubled per attempt
+RETRY_MAX_S = 8.0  # Backoff cap
+RETRY_AFTER_MAX_S = 60.0  # Cap on a server-provided Retry-After
+MAX_REQUESTS_PER_S = 0.0  # Client-side request rate cap (0 = unlimited)
+RATE_LIMIT_PAUSE_S = 1.0  # Pause when the server is out of quota but gives no reset time
+KEEPALIVE_EXPIRY_S = 30.0  # Idle pooled connections are kept this long
+HTTP2_MAX_CONNECTIONS = 8  # With HTTP/2 many streams share few connections
+TOKEN_CACHE_FILE = Path.home() / ".cache" / "users_creator" / "token.json"  # Admin JWT kept between runs
+TOKEN_REUSE_MARGIN_S = 60.0  # A cached token is reused while it has this long left
 
 # ---------------------------------------------------------------------------
 # Helpers -------------------------------------------------------------------
 # ---------------------------------------------------------------------------
 
-def read_users_from_csv(csv_path: str | Path) -> List[Dict]:
-    """Read users from a CSV file and return a list of user dictionaries.
-    
-    Expected CSV columns: username, first_name, last_name, phone_number, email, password
-    """
-    users = []
-    csv_path = Path(csv_path)
-    
-    if not csv_path.exists():
-        raise FileNotFoundError(f"CSV file not found: {csv_path}")
-    
-    with open(csv_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        required_fields = {"username", "first_name", "last_name", "phone_number", "email", "password"}
-        
-        # Validate CSV has required columns
-        if not required_fields.issubset(reader.fieldnames or []):
-            missing = required_fields - (set(reader.fieldnames or []))
-            raise ValueError(f"CSV missing required columns: {', '.join(missing)}")
-        
+def _csv_users(csv_path: Path, header: List[str]) -> Iterator[Dict]:
+    """Yield validated users using the stdlib parser, one row at a time."""
+    # Column positions are resolved once; rows are plain lists
+    slots = [(name, header.index(name)) for name in USER_FIELDS]
+    width = max(i for _, i in slots) + 1
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
         for row_num, row in enumerate(reader, start=2):  # Start at 2 (header is row 1)
             # Skip empty rows
-            if not any(row.values()):
+            if not any(row):
                 continue
             
             # Create user dict with only the required fields
-            user = {
-                "username": row["username"].strip(),
-                "first_name": row["first_name"].strip(),
-                "last_name": row["last_name"].strip(),
-                "phone_number": row["phone_number"].strip(),
-                "email": row["email"].strip(),
-                "password": row["password"].strip(),
-            }
+            if len(row) < width:
+                row = row + [""] * (width - len(row))
+            user = {name: row[i].strip() for name, i in slots}
             
             # Validate required fields are not empty
             if not all(user.values()):
                 print(f"Warning: Skipping row {row_num} - missing required fields")
                 continue
             
-            users.append(user)
+            yield user
+
+
+def iter_users_from_csv(csv_path: str | Path) -> Iterator[Dict]:
+    """Yield user dictionaries from a CSV file, one row at a time.
+    
+    Expected CSV columns: username, first_name, last_name, phone_number, email, password
+    """
+    csv_path = Path(csv_path)
+    
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV file not found: {csv_path}")
+    
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f), None) or []
+    
+    # Validate CSV has required columns
+    if not set(USER_FIELDS).issubset(header):
+        missing = set(USER_FIELDS) - set(header)
+        raise ValueError(f"CSV missing required columns: {', '.join(missing)}")
     
-    return users
+    users = _csv_users(csv_path, header)
+    
+    # The server rejects a repeated username, email or phone number anyway;
+    # dropping repeats here saves their round-trips
+    seen_usernames, seen_emails, seen_phones = set(), set(), set()
+    duplicates = 0
+    for user in users:
+        if (
+            user["username"] in seen_usernames
+            or user["email"] in seen_emails
+            or user["phone_number"] in seen_phones
+        ):
+            duplicates += 1
+            continue
+        seen_usernames.add(user["username"])
+        seen_emails.add(user["email"])
+        seen_phones.add(user["phone_number"])
+        yield user
+    
+    if duplicates:
+        print(f"Skipped {duplicates} duplicate row(s) in the CSV file")
 
 
-def _obtain_access_token(client: httpx.Client) -> str:
-    resp = client.post(
-        f"{API_BASE_URL}/auth/token",
+async def _obtain_access_token(client: httpx.AsyncClient) -> str:
+    resp = await client.post(
+        TOKEN_PATH,
         json={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD},
-        timeout=15,
     )
     resp.raise_for_status()
     return resp.json()["access_token"]
 
 
-def create_users(csv_path: str | Path):
-    """Create users from a CSV file."""
+def _jwt_exp(token: str) -> float | None:
+    # Reads the "exp" claim without verifying the signature (we only need the timing)
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except Exception:
+        return None
+
+
+def _load_cached_token() -> str | None:
+    try:
+        cached = json.loads(TOKEN_CACHE_FILE.read_text(encoding="utf-8"))
+        if cached["api"] != API_BASE_URL or cached["username"] != ADMIN_USERNAME:
+            return None
+        if cached["exp"] - time.time() <= TOKEN_REUSE_MARGIN_S:
+            return None
+        return cached["token"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _store_cached_token(token: str) -> None:
+    exp = _jwt_exp(token)
+    if exp is None:
+        return
+    record = {"api": API_BASE_URL, "username": ADMIN_USERNAME, "token": token, "exp": exp}
+    try:
+        TOKEN_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = TOKEN_CACHE_FILE.with_suffix(".tmp")
+        # The token grants admin access: keep it readable by the owner only
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp, TOKEN_CACHE_FILE)
+    except OSError as exc:
+        print(f"Warning: could not cache admin token: {exc}")
+
+
+# Whether the client's token came from TOKEN_CACHE_FILE (and may have been
+# revoked server-side since), and the lock serialising re-logins
+_token_from_cache = False
+_auth_lock: asyncio.Lock | None = None
+
+
+async def _authenticate(client: httpx.AsyncClient, use_cache: bool = True) -> None:
+    """Set the client's bearer token, from the cache when it is still valid."""
+    global _token_from_cache
+    token = _load_cached_token() if use_cache else None
+    _token_from_cache = token is not None
+    if token is None:
+        token = await _obtain_access_token(client)
+        _store_cached_token(token)
+    # Set once on the client instead of merged into every request
+    client.headers["Authorization"] = f"Bearer {token}"
+
+
+async def _reauthenticate(client: httpx.AsyncClient, rejected: str | None) -> bool:
+    """Replace a cached token the server answered 401 to; True if the request is worth retrying."""
+    async with _auth_lock:
+        if client.headers.get("Authorization") != rejected:
+            return True  # another worker already logged in again
+        if not _token_from_cache:
+            return False
+        await _authenticate(client, use_cache=False)
+        return True
+
+
+SKIP_DETAILS = {"Username already exists", "Email already used", "Phone number already used"}
+# The same details as they appear in the compact JSON error body, so a reject
+# can be recognised without decoding it
+SKIP_BODY_MARKERS = tuple(f'"detail":"{detail}"'.encode() for detail in SKIP_DETAILS)
+
+# Flipped off when the server has no bulk route; later batches go per user
+_bulk_endpoint_available = True
+_bulk_slots = asyncio.Semaphore(BULK_CONCURRENCY)
+
+
+def _json_body(payload) -> Dict:
+    """httpx keyword arguments sending *payload* as JSON, encoded by orjson or msgspec when installed.
+
+    The body is encoded once, so retries resend the same bytes.
+    """
+    if _encode_json is None:
+        return {"json": payload}
+    return {"content": _encode_json(payload), "headers": {"Content-Type": "application/json"}}
+
+
+def chunked(iterable, n: int) -> Iterator[List]:
+    """Yield lists of up to *n* consecutive items from *iterable*."""
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, n)):
+        yield batch
+
+
+# Per-user status lines are collected and written OUTPUT_FLUSH_LINES at a
+# time instead of one print() each. All writers run on the event loop thread,
+# so no lock is needed.
+OUTPUT_FLUSH_LINES = 500
+_output: List[str] = []
+
+
+def _emit(line: str) -> None:
+    _output.append(line + "\n")
+    if len(_output) >= OUTPUT_FLUSH_LINES:
+        _flush_output()
+
+
+def _flush_output() -> None:
+    sys.stdout.write("".join(_output))
+    sys.stdout.flush()
+    _output.clear()
+
+
+def _report(username: str, status_code: int, detail: str | None, body: str) -> None:
+    if status_code == 201:
+        _emit(f"✔ Created {username}")
+    elif status_code == 400 and detail in SKIP_DETAILS:
+        _emit(f"• Skipped {username} (already exists)")
+    else:
+        _emit(f"✖ Failed to create {username}: {status_code} – {body}")
+
+
+def _report_unknown(username: str, exc: Exception) -> None:
+    # The request reached the server but no answer came back: it may or may not
+    # have created the user, and replaying could create it twice
+    _emit(f"? Unknown outcome for {username} (check on the server): {exc!r}")
+
+
+def _retry_after_s(resp: httpx.Response) -> float | None:
+    # Retry-After is either delta-seconds or an HTTP date
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), RETRY_AFTER_MAX_S)
+
+
+class RateLimiter:
+    """Request pacing shared by all POST workers.
+
+    Spaces requests to at most ``rate`` per second (0 disables that) and
+    holds every worker back once the server reports its quota exhausted:
+    a 429, or ``X-RateLimit-Remaining: 0`` with ``X-RateLimit-Reset``.
+    """
+
+    def __init__(self, rate: float) -> None:
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            start = max(now, self._next_at, self._paused_until)
+            self._next_at = start + self._interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def observe(self, resp: httpx.Response) -> None:
+        pause = None
+        if resp.status_code == 429:
+            pause = _retry_after_s(resp) or RATE_LIMIT_PAUSE_S
+        elif resp.headers.get("X-RateLimit-Remaining", "").strip() == "0":
+            pause = _rate_limit_reset_s(resp) or RATE_LIMIT_PAUSE_S
+        if pause:
+            resume_at = asyncio.get_running_loop().time() + pause
+            self._paused_until = max(self._paused_until, resume_at)
+
+
+def _rate_limit_reset_s(resp: httpx.Response) -> float | None:
+    # X-RateLimit-Reset is seconds until reset, or an epoch timestamp on some servers
+    try:
+        value = float(resp.headers.get("X-RateLimit-Reset", ""))
+    except ValueError:
+        return None
+    if value > 1e9:
+        value -= datetime.now(timezone.utc).timestamp()
+    return min(max(0.0, value), RETRY_AFTER_MAX_S)
+
+
+_rate_limiter = RateLimiter(MAX_REQUESTS_PER_S)
+
+
+async def _post_with_retries(client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+    """POST *url*, retrying connection failures, 429 and 503 with jittered exponential backoff.
+
+    Only failures where the server cannot have processed the POST are retried,
+    so a creation is never replayed. Read timeouts and other 5xx are left to
+    the caller.
+
+    A ``Retry-After`` header on the response replaces the computed delay. A 401
+    to a cached token triggers one fresh login and an immediate retry. The last
+    response (or transport error) is returned (raised) once attempts run out.
+    """
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        delay = None
+        await _rate_limiter.acquire()
+        try:
+            resp = await client.post(url, **kwargs)
+            _rate_limiter.observe(resp)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if attempt == RETRY_ATTEMPTS:
+                raise
+        else:
+            if resp.status_code == 401 and attempt < RETRY_ATTEMPTS:
+                if await _reauthenticate(client, resp.request.headers.get("Authorization")):
+                    continue
+            retryable = resp.status_code in (429, 503)
+            if not retryable or attempt == RETRY_ATTEMPTS:
+                return resp
+            delay = _retry_after_s(resp)
+        if delay is None:
+            delay = min(RETRY_MAX_S, RETRY_BASE_S * 2 ** (attempt - 1)) * (0.75 + random.random() * 0.5)
+        await asyncio.sleep(delay)
+
+
+async def _post_user(client: httpx.AsyncClient, user: Dict) -> None:
     try:
-        users_to_create = read_users_from_csv(csv_path)
+        resp = await _post_with_retries(
+            client,
+            ADMIN_PATH,
+            **_json_body(user),
+        )
+        if resp.status_code == 400 and any(marker in resp.content for marker in SKIP_BODY_MARKERS):
+            _emit(f"• Skipped {user['username']} (already exists)")
+        else:
+            _report(user["username"], resp.status_code, None, resp.text)
+    except (httpx.ConnectError, httpx.ConnectTimeout) as exc:
+        _emit(f"✖ Error for {user['username']}: {exc}")
+    except httpx.TransportError as exc:
+        _report_unknown(user["username"], exc)
+    except Exception as exc:
+        _emit(f"✖ Error for {user['username']}: {exc}")
+
+
+async def _post_batch(client: httpx.AsyncClient, batch: List[Dict]) -> None:
+    global _bulk_endpoint_available
+    if _bulk_endpoint_available:
+        try:
+            async with _bulk_slots:
+                resp = await _post_with_retries(
+                    client,
+                    BULK_PATH,
+                    timeout=httpx.Timeout(BULK_READ_TIMEOUT_S, connect=5.0),
+                    **_json_body({"users": batch}),
+                )
+        except (httpx.ConnectError, httpx.ConnectTimeout) as exc:
+            for user in batch:
+                _emit(f"✖ Error for {user['username']}: {exc}")
+            return
+        except httpx.TransportError as exc:
+            # Never replayed: the server may have created any part of the batch
+            for user in batch:
+                _report_unknown(user["username"], exc)
+            return
+        if resp.status_code in (404, 405):
+            _bulk_endpoint_available = False
+        elif resp.status_code == 200:
+            try:
+                results = [(r["username"], r["status_code"], r.get("detail")) for r in resp.json()]
+            except Exception as exc:
+                # Processed, but the per-user outcomes cannot be read
+                for user in batch:
+                    _report_unknown(user["username"], exc)
+                return
+            for username, status_code, detail in results:
+                _report(username, status_code, detail, str(detail))
+            return
+        # Anything else (e.g. 422 when one row fails validation) is retried
+        # per user below so every row gets its own outcome; the bulk route
+        # commits all or nothing, so none of the batch was created.
+    for user in batch:
+        await _post_user(client, user)
+
+
+async def _post_worker(queue: asyncio.Queue, client: httpx.AsyncClient) -> None:
+    # None is the end-of-input sentinel
+    while (batch := await queue.get()) is not None:
+        try:
+            await _post_batch(client, batch)
+        except Exception as exc:
+            # Keep the worker alive: the producer blocks on a full queue
+            for user in batch:
+                _emit(f"✖ Error for {user['username']}: {exc}")
+
+
+def _produce(users: Iterator[Dict], queue: asyncio.Queue, loop: asyncio.AbstractEventLoop,
+             workers_gone: threading.Event) -> int:
+    """Parse the CSV on a worker thread and hand batches to the event loop.
+
+    Stops early once *workers_gone* is set, since nothing would drain the
+    queue. Returns the number of users queued.
+    """
+    count = 0
+    try:
+        for batch in chunked(users, BULK_SIZE):
+            # Blocks while the queue is full, so parsing stays QUEUE_SIZE
+            # batches ahead of the POSTs at most
+            put = asyncio.run_coroutine_threadsafe(queue.put(batch), loop)
+            while True:
+                try:
+                    put.result(timeout=PRODUCER_POLL_S)
+                    break
+                except concurrent.futures.TimeoutError:
+                    if workers_gone.is_set():
+                        put.cancel()
+                        print("POST workers stopped; not reading the rest of the CSV file")
+                        return count
+            count += len(batch)
     except Exception as exc:
         print(f"Failed to read CSV file: {exc}")
-        sys.exit(1)
-    
-    if not users_to_create:
-        print("No users found in CSV file.")
-        sys.exit(0)
-    
-    print(f"Found {len(users_to_create)} user(s) to create...")
-    
-    with httpx.Client() as client:
+    return count
+
+
+async def create_users(csv_path: str | Path):
+    """Create users from a CSV file."""
+    global _auth_lock
+    # HTTP/2 is negotiated through TLS ALPN, so it only applies to https; the
+    # server may still answer in HTTP/1.1.
+    use_http2 = h2 is not None and API_BASE_URL.startswith("https://")
+    # HTTP/2 multiplexes the concurrent POSTs over a few connections; with
+    # HTTP/1.1 each concurrent request needs its own. Either way connections
+    # are kept alive between POSTs so none pays a fresh TCP/TLS handshake.
+    max_connections = HTTP2_MAX_CONNECTIONS if use_http2 else MAX_CONCURRENCY
+    async with httpx.AsyncClient(
+        base_url=API_BASE_URL,
+        http2=use_http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY_S,
+        ),
+        headers={"User-Agent": "users-creator/1"},
+        timeout=httpx.Timeout(15.0, connect=5.0),
+    ) as client:
+        # Fail fast when the API is down, before any CSV parsing; this also
+        # leaves a warm pooled connection for the first POST.
         try:
-            token = _obtain_access_token(client)
+            resp = await client.get(HEALTH_PATH, timeout=HEALTH_TIMEOUT_S)
+            resp.raise_for_status()
+        except httpx.HTTPError as exc:
+            print(f"API not reachable at {API_BASE_URL}: {exc}")
+            sys.exit(1)
+
+        try:
+            users = iter_users_from_csv(csv_path)
+            # Peek one row so header/file errors and empty files surface up front
+            first = next(users, None)
+        except Exception as exc:
+            print(f"Failed to read CSV file: {exc}")
+            sys.exit(1)
+
+        if first is None:
+            print("No users found in CSV file.")
+            sys.exit(0)
+
+        print("Creating users...")
+
+        _auth_lock = asyncio.Lock()
+        try:
+            await _authenticate(client)
         except Exception as exc:
             print(f"Failed to authenticate as admin: {exc}")
             sys.exit(1)
 
-        headers = {"Authorization": f"Bearer {token}"}
-        for user in users_to_create:
-            try:
-                resp = client.post(
-                    f"{API_BASE_URL}/administration/",
-                    json=user,
-                    headers=headers,
-                    timeout=15,
-                )
-                if resp.status_code == 201:
-                    print(f"✔ Created {user['username']}")
-                elif resp.status_code == 400 and resp.json().get("detail") in {"Username already exists", "Email already used", "Phone number already used"}:
-                    print(f"• Skipped {user['username']} (already exists)")
-                else:
-                    print(f"✖ Failed to create {user['username']}: {resp.status_code} – {resp.text}")
-            except Exception as exc:
-                print(f"✖ Error for {user['username']}: {exc}")
+        # The CSV is parsed on a thread while batches are posted, so parsing
+        # neither waits on the network nor stalls the event loop.
+        # MAX_CONCURRENCY workers bound the requests in flight, QUEUE_SIZE
+        # bounds memory.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        workers = [asyncio.create_task(_post_worker(queue, client)) for _ in range(MAX_CONCURRENCY)]
+        all_workers = asyncio.gather(*workers, return_exceptions=True)
+        # Set from the loop when every worker has exited, read by the producer thread
+        workers_gone = threading.Event()
+        all_workers.add_done_callback(lambda _: workers_gone.set())
+        loop = asyncio.get_running_loop()
+        count = 0
+        try:
+            count = await loop.run_in_executor(
+                None, _produce, itertools.chain([first], users), queue, loop, workers_gone
+            )
+        finally:
+            # Sentinels only while some worker can still take them; a put on a
+            # full queue with no consumers would block forever
+            for _ in workers:
+                put = asyncio.ensure_future(queue.put(None))
+                await asyncio.wait([put, all_workers], return_when=asyncio.FIRST_COMPLETED)
+                if not put.done():
+                    put.cancel()
+                    break
+            for exc in await all_workers:
+                if isinstance(exc, BaseException):
+                    print(f"✖ POST worker failed: {exc!r}")
+            _flush_output()
+
+    print(f"Processed {count} user(s).")
 
 
 if __name__ == "__main__":
@@ -133,4 +579,4 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
     
-    create_users(args.csv_file)
+    asyncio.run(create_users(args.csv_file))